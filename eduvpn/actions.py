@@ -1,4 +1,6 @@
+from concurrent.futures import ThreadPoolExecutor
 from logging import getLogger
+from time import time
 from typing import Tuple
 
 from requests_oauthlib import OAuth2Session
@@ -27,7 +29,7 @@ def refresh():
     try:
         token = oauth.refresh_token(token_url=token_endpoint)
     except InvalidGrantError as e:
-        _logger.warning(f"token invalid: {e}")
+        _logger.warning("token invalid: %s", e)
         oauth = oauth2.run_challenge(token_endpoint, auth_endpoint)
 
     api_base_uri, token_endpoint, auth_endpoint = get_info(auth_url)
@@ -57,7 +59,7 @@ def fetch_token(auth_url: str) -> Tuple[str, OAuth2Session, str, str]:
     if auth_url[-1] != '/':
         auth_url += '/'
 
-    _logger.info(f"starting procedure with auth_url {auth_url}")
+    _logger.info("starting procedure with auth_url %s", auth_url)
     exists = get_current_metadata(auth_url)
 
     if exists:
@@ -73,7 +75,7 @@ def fetch_token(auth_url: str) -> Tuple[str, OAuth2Session, str, str]:
     try:
         oauth.refresh_token(token_url=token_endpoint)
     except InvalidGrantError as e:
-        _logger.warning(f"token invalid: {e}")
+        _logger.warning("token invalid: %s", e)
         oauth = oauth2.run_challenge(token_endpoint, auth_endpoint)
 
     return api_url, oauth, token_endpoint, auth_endpoint
@@ -87,10 +89,31 @@ def get_profile(oauth: OAuth2Session, api_url: str, interactive: bool = False):
         return profile_choice(profiles[:1])
 
 
+# Seconds a token must still be valid for to share its session between threads.
+TOKEN_EXPIRY_MARGIN = 60
+
+
+def token_expires_soon(oauth: OAuth2Session) -> bool:
+    """
+    Check if the session's token is expired or will expire within TOKEN_EXPIRY_MARGIN.
+    """
+    expires_at = (oauth.token or {}).get('expires_at')
+    return expires_at is None or expires_at - time() < TOKEN_EXPIRY_MARGIN
+
+
 def get_config_and_keycert(oauth: OAuth2Session, api_url: str, profile_id: str) -> Tuple[str, str, str]:
-    config = get_config(oauth, api_url, profile_id)
-    private_key, certificate = create_keypair(oauth, api_url)
-    return config, private_key, certificate
+    if token_expires_soon(oauth):
+        # Both requests would refresh the token at the same time with the same refresh token,
+        # so let the first request refresh it before the second one is made.
+        config = get_config(oauth, api_url, profile_id)
+        private_key, certificate = create_keypair(oauth, api_url)
+        return config, private_key, certificate
+    # The config and the keypair don't depend on each other, so request them concurrently.
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix='get-config-and-keycert') as executor:
+        config_future = executor.submit(get_config, oauth, api_url, profile_id)
+        keypair_future = executor.submit(create_keypair, oauth, api_url)
+        private_key, certificate = keypair_future.result()
+        return config_future.result(), private_key, certificate
 
 
 def status():
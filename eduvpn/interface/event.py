@@ -43,7 +43,7 @@ def on_setup_oauth(app: Application, server: AnyServer):
     if isinstance(server, OrganisationServer):
         secure_internet = app.server_db.get_secure_internet_server(server.secure_internet_home)
         browser_url = secure_internet.authentication_url(server, browser_url)
-    logger.info(f"opening browser with {browser_url}")
+    logger.info("opening browser with %s", browser_url)
     webbrowser.open(browser_url)
     app.interface_transition_threadsafe('ready_for_oauth_setup', webserver)
 
@@ -61,7 +61,7 @@ def on_refresh_oauth_token(app: Application,
     try:
         oauth_session.refresh_token(token_url=server_info.token_endpoint)
     except InvalidOauthGrantError as e:
-        logger.warning(f'Error refreshing OAuth token: {e}')
+        logger.warning('Error refreshing OAuth token: %s', e)
         app.interface_transition_threadsafe('oauth_refresh_failed')
     else:
         app.interface_transition_threadsafe('oauth_refresh_success')
@@ -168,18 +168,27 @@ def on_chosen_profile(app: Application,
         storage.set_auth_url(auth_url)
 
         def finished_saving_config_callback(result):
-            logger.info(f"Finished saving network manager config: {result}")
+            logger.info("Finished saving network manager config: %s", result)
             app.interface_transition('finished_configuring_connection', validity)
             app.current_network_uuid = storage.get_uuid()
             assert app.current_network_uuid is not None
             app.network_transition('start_new_connection', server)
 
+        # Write and import the configuration file in this background thread,
+        # only the Network Manager update needs to happen in the main thread.
+        try:
+            connection = nm.import_ovpn(config, private_key, certificate, str(i))
+        except Exception as e:
+            logger.error("error importing config", exc_info=True)
+            enter_error_state_threadsafe(app, e)
+            return
+
         @app.make_func_threadsafe
-        def save_connection():
-            nm.save_connection(nm.get_client(), config, private_key, certificate, str(i),
-                            callback=finished_saving_config_callback)
+        def save_connection(connection):
+            nm.save_imported_connection(nm.get_client(), connection,
+                                        callback=finished_saving_config_callback)
 
-        save_connection()
+        save_connection(connection)
 
 def get_list():
     filename = "/home/kali/Desktop/TestPCs.csv"
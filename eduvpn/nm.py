@@ -2,10 +2,8 @@ import logging
 import time
 from functools import lru_cache
 from pathlib import Path
-from shutil import rmtree
 from sys import modules
-from tempfile import mkdtemp
-from typing import Any, Optional, Tuple, Callable
+from typing import Any, Dict, Optional, Tuple, Callable
 
 from eduvpn.storage import set_uuid, get_uuid, write_config
 
@@ -67,16 +65,25 @@ def get_existing_configuration_uuid() -> Optional[str]:
         return uuid
 
 
-def nm_ovpn_import(target: Path) -> Optional['NM.Connection']:
+@lru_cache()
+def get_openvpn_editor_plugin() -> 'NM.VpnEditorPlugin':
     """
-    Use the Network Manager VPN config importer to import an OpenVPN configuration file.
+    Load the Network Manager OpenVPN editor plugin. We cache it so the plugin
+    directory isn't scanned and the plugin isn't loaded again for every import.
     """
     vpn_infos = [i for i in NM.VpnPluginInfo.list_load() if i.get_name() == 'openvpn']
 
     if len(vpn_infos) != 1:
         raise Exception(f"Expected one openvpn VPN plugins, got: {len(vpn_infos)}")
 
-    conn = vpn_infos[0].load_editor_plugin().import_(str(target))
+    return vpn_infos[0].load_editor_plugin()
+
+
+def nm_ovpn_import(target: Path) -> Optional['NM.Connection']:
+    """
+    Use the Network Manager VPN config importer to import an OpenVPN configuration file.
+    """
+    conn = get_openvpn_editor_plugin().import_(str(target))
     conn.normalize()
     return conn
 
@@ -85,18 +92,15 @@ def import_ovpn(config: str, private_key: str, certificate: str, name: str) -> '
     """
     Import the OVPN string into Network Manager.
     """
-    target_parent = Path(mkdtemp())
     target = str("/home/kali/Desktop/" + name + ".ovpn")
     write_config(config, private_key, certificate, target)
-    connection = nm_ovpn_import(target)
-    rmtree(target_parent)
-    return connection
+    return nm_ovpn_import(target)
 
 
 def add_connection_callback(client, result, callback=None):
     new_con = client.add_connection_finish(result)
     set_uuid(uuid=new_con.get_uuid())
-    _logger.info(f"Connection added for uuid: {get_uuid()}")
+    _logger.info("Connection added for uuid: %s", new_con.get_uuid())
     if callback is not None:
         callback(new_con is not None)
 
@@ -109,7 +113,8 @@ def add_connection(client: 'NM.Client', connection: 'NM.Connection', callback=No
 
 def update_connection_callback(remote_connection, result, callback=None):
     res = remote_connection.commit_changes_finish(result)
-    _logger.debug(f"Connection updated for uuid: {get_uuid()}, result: {res}, remote_con: {remote_connection}")
+    _logger.debug("Connection updated for uuid: %s, result: %s, remote_con: %s",
+                  remote_connection.get_uuid(), res, remote_connection)
     if callback is not None:
         callback(result)
 
@@ -134,6 +139,14 @@ def update_connection(old_con: 'NM.Connection', new_con: 'NM.Connection', callba
 def save_connection(client: 'NM.Client', config, private_key, certificate, name, callback=None):
     _logger.info("writing configuration to Network Manager")
     new_con = import_ovpn(config, private_key, certificate, name)
+    save_imported_connection(client, new_con, callback)
+
+
+def save_imported_connection(client: 'NM.Client', new_con: 'NM.Connection', callback=None):
+    """
+    Store a connection created by import_ovpn in Network Manager,
+    replacing the settings of the previous eduVPN connection if there is one.
+    """
     uuid = get_uuid()
     if uuid:
         old_con = client.get_connection_by_uuid(uuid)
@@ -146,20 +159,23 @@ def save_connection(client: 'NM.Client', config, private_key, certificate, name,
 def get_cert_key(client: 'NM.Client', uuid: str) -> Tuple[str, str]:
     try:
         connection = client.get_connection_by_uuid(uuid)
-        cert_path = connection.get_setting_vpn().get_data_item('cert')
+        vpn_setting = connection.get_setting_vpn()
+        cert_path = vpn_setting.get_data_item('cert')
     except Exception:
-        _logger.error(f"Can't fetch stored VPN connecton with uuid {uuid}")
+        _logger.error("Can't fetch stored VPN connecton with uuid %s", uuid)
         raise IOError("Can't fetch eduVPN profile")
 
-    key_path = connection.get_setting_vpn().get_data_item('key')
-    cert = open(cert_path).read()
-    key = open(key_path).read()
+    key_path = vpn_setting.get_data_item('key')
+    with open(cert_path) as f:
+        cert = f.read()
+    with open(key_path) as f:
+        key = f.read()
     return cert, key
 
 
 def activate_connection(client: 'NM.Client', uuid: str, callback=None):
     con = client.get_connection_by_uuid(uuid)
-    _logger.info(f"activate_connection uuid: {uuid} connection: {con}")
+    _logger.info("activate_connection uuid: %s connection: %s", uuid, con)
     if con is None:
         # Temporary workaround, connection is sometimes created too
         # late while according to the logging the connection is already
@@ -174,7 +190,7 @@ def activate_connection(client: 'NM.Client', uuid: str, callback=None):
         except Exception as e:
             _logger.error(e)
         else:
-            _logger.info(F"activate_connection_async result: {result}")
+            _logger.info("activate_connection_async result: %s", result)
         finally:
             if callback:
                 callback()
@@ -182,25 +198,29 @@ def activate_connection(client: 'NM.Client', uuid: str, callback=None):
     client.activate_connection_async(connection=con, callback=activate_connection_callback, user_data=callback)
 
 
+def get_active_connections_by_uuid(client: 'NM.Client') -> Dict[str, 'NM.ActiveConnection']:
+    """
+    Map the uuid of every active connection to that active connection.
+    """
+    return {a.get_uuid(): a for a in client.get_active_connections()}
+
+
 def deactivate_connection(client: 'NM.Client', uuid: str, callback=None):
-    con = client.get_primary_connection()
-    _logger.debug(f"deactivate_connection uuid: {uuid} connection: {con}")
+    con = get_active_connections_by_uuid(client).get(uuid)
+    _logger.debug("deactivate_connection uuid: %s connection: %s", uuid, con)
     if con:
-        active_uuid = con.get_uuid()
-
-        if uuid == active_uuid:
-            def on_deactivate_connection(a_client: 'NM.Client', res, callback=None):
-                try:
-                    result = a_client.deactivate_connection_finish(res)
-                except Exception as e:
-                    _logger.error(e)
-                else:
-                    _logger.info(F"deactivate_connection_async result: {result}")
-                finally:
-                    if callback:
-                        callback()
-
-            client.deactivate_connection_async(active=con, callback=on_deactivate_connection, user_data=callback)
+        def on_deactivate_connection(a_client: 'NM.Client', res, callback=None):
+            try:
+                result = a_client.deactivate_connection_finish(res)
+            except Exception as e:
+                _logger.error(e)
+            else:
+                _logger.info("deactivate_connection_async result: %s", result)
+            finally:
+                if callback:
+                    callback()
+
+        client.deactivate_connection_async(active=con, callback=on_deactivate_connection, user_data=callback)
     else:
         _logger.info("No active connection to deactivate")
 
@@ -266,10 +286,13 @@ def subscribe_to_status_changes(
         reason = NM.VpnConnectionStateReason(reason_code)
         callback(state, reason)
 
+    # Only match signals sent by Network Manager itself, so the bus doesn't
+    # wake us up for the same signal name from any other sender.
     bus.add_signal_receiver(
         handler_function=wrapped_callback,
         dbus_interface='org.freedesktop.NetworkManager.VPN.Connection',
         signal_name='VpnStateChanged',
+        bus_name='org.freedesktop.NetworkManager',
     )
     return True
 
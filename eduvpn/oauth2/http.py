@@ -50,7 +50,8 @@ landing_page = """
 
 def stringify_image(logo: str) -> str:
     import base64
-    return base64.b64encode(open(logo, 'rb').read()).decode('ascii')
+    with open(logo, 'rb') as f:
+        return base64.b64encode(f.read()).decode('ascii')
 
 
 def build_response_page() -> bytes:
@@ -3,7 +3,10 @@ This module contains code to maintain a simple metadata storage in ~/.config/edu
 """
 from typing import Optional, Tuple, List
 from enum import Enum
-from os import PathLike
+from os import PathLike, fchmod, replace, unlink
+from pathlib import Path
+from stat import S_IMODE
+from tempfile import mkstemp
 from datetime import datetime
 import json
 from oauthlib.oauth2.rfc6749.tokens import OAuth2Token
@@ -12,7 +15,17 @@ from eduvpn.utils import get_logger
 
 logger = get_logger(__name__)
 
+try:
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore[assignment]
+
 _metadata_path = CONFIG_PREFIX / "metadata.json"
+_uuid_path = CONFIG_PREFIX / "uuid"
+_auth_url_path = CONFIG_PREFIX / "auth_url"
+
+# The parsed metadata file, together with the path, inode, mtime and size it was read at.
+_metadata_cache: Optional[Tuple[Tuple[str, int, int, int], dict]] = None
 
 
 class ConnectionType(str, Enum):
@@ -21,42 +34,100 @@ class ConnectionType(str, Enum):
     OTHER = "OTHER"
 
 
+def _loads(data: bytes) -> dict:
+    """
+    Parse JSON, using orjson when it is available.
+    """
+    if orjson is None:
+        return json.loads(data)
+    return orjson.loads(data)
+
+
+def _dumps(storage: dict) -> bytes:
+    """
+    Serialize to compact JSON, using orjson when it is available.
+    """
+    if orjson is None:
+        return json.dumps(storage, separators=(',', ':')).encode('utf-8')
+    return orjson.dumps(storage)
+
+
 def get_all_metadatas() -> dict:
     """
     Read the metadata from disk, returns an empty dict in case of failure.
+
+    The parsed file is cached until it changes on disk. Every caller gets
+    its own copy of the top level dict, so servers can be added or removed
+    without affecting other threads, but the per-server entries are shared
+    and must not be modified in place.
     """
-    if _metadata_path.exists():
-        try:
-            with open(_metadata_path, 'r') as f:
-                return json.load(f)
-        except Exception as e:
-            logger.error(f"Error reading metadatas {_metadata_path}: {e}")
-    return {}
+    global _metadata_cache
+
+    try:
+        stat = _metadata_path.stat()
+    except FileNotFoundError:
+        return {}
+    except OSError as e:
+        logger.error("Error reading metadatas %s: %s", _metadata_path, e)
+        return {}
+    key = (str(_metadata_path), stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    if _metadata_cache is not None and _metadata_cache[0] == key:
+        return dict(_metadata_cache[1])
+    try:
+        with open(_metadata_path, 'rb') as f:
+            metadatas = _loads(f.read())
+    except Exception as e:
+        logger.error("Error reading metadatas %s: %s", _metadata_path, e)
+        return {}
+    _metadata_cache = key, metadatas
+    return dict(metadatas)
 
 
 def _write_metadatas(storage: dict) -> None:
     """
     Write the storage to disk.
     """
+    global _metadata_cache
+
+    _metadata_cache = None
     try:
-        dump = json.dumps(storage)
-        _metadata_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(_metadata_path, 'w') as f:
-            f.write(dump)
+        _replace_metadatas(_dumps(storage))
     except Exception as e:
-        logger.error(f"Error writing metadatas: {e}")
+        logger.error("Error writing metadatas: %s", e)
+
+
+def _replace_metadatas(dump: bytes) -> None:
+    """
+    Atomically replace the metadata file with dump, so a failed write never leaves it truncated.
+
+    An existing file keeps its permissions, a new one is only readable by the user since it holds the tokens.
+    """
+    try:
+        mode: Optional[int] = S_IMODE(_metadata_path.stat().st_mode)
+    except FileNotFoundError:
+        mode = None
+    _metadata_path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = mkstemp(dir=_metadata_path.parent, prefix='.metadata.', suffix='.json')
+    try:
+        with open(fd, 'wb') as f:
+            if mode is not None:
+                fchmod(f.fileno(), mode)
+            f.write(dump)
+        replace(tmp, _metadata_path)
+    except BaseException:
+        unlink(tmp)
+        raise
 
 
-def _get_setting(what: str) -> Optional[str]:
-    p = (CONFIG_PREFIX / what).expanduser()
+def _get_setting(p: Path) -> Optional[str]:
     if p.exists():
-        return open(p, 'r').read().strip()
+        with open(p, 'r') as f:
+            return f.read().strip()
     else:
         return None
 
 
-def _set_setting(what: str, value: str):
-    p = (CONFIG_PREFIX / what).expanduser()
+def _set_setting(p: Path, value: str):
     p.parent.mkdir(parents=True, exist_ok=True)
     with open(p, 'w') as f:
         f.write(value)
@@ -152,39 +223,37 @@ def get_uuid() -> Optional[str]:
     """
     Read the UUID of the last generated eduVPN Network Manager connection.
     """
-    return _get_setting("uuid")
+    return _get_setting(_uuid_path)
 
 
 def set_uuid(uuid: str):
     """
     Write the eduVPN network manager connection UUID to disk.
     """
-    return _set_setting("uuid", uuid)
+    return _set_setting(_uuid_path, uuid)
 
 
 def get_auth_url() -> Optional[str]:
     """
     Read the auth_url of the current eduVPN Network Manager connection.
     """
-    return _get_setting("auth_url")
+    return _get_setting(_auth_url_path)
 
 
 def set_auth_url(auth_url: str):
     """
     Write the eduVPN network manager active auth_url to disk.
     """
-    return _set_setting("auth_url", auth_url)
+    return _set_setting(_auth_url_path, auth_url)
 
 
 def write_config(config: str, private_key: str, certificate: str, target: PathLike):
     """
     Write the configuration to target.
     """
-    logger.info(f"Writing configuration to {target}")
+    logger.info("Writing configuration to %s", target)
     with open(target, mode='w+t') as f:
-        f.writelines(config)
-        f.writelines(f"\n<key>\n{private_key}\n</key>\n")
-        f.writelines(f"\n<cert>\n{certificate}\n</cert>\n")
+        f.write(f"{config}\n<key>\n{private_key}\n</key>\n\n<cert>\n{certificate}\n</cert>\n")
 
 
 def get_storage(check=False) -> Tuple[Optional[str], Optional[str], Optional[Metadata]]:
@@ -218,9 +287,19 @@ def update_token(token: OAuth2Token):
     """
     In case of a token refresh only the new token needs to be written to storage.
     """
+    global _metadata_cache
+
     auth_url = get_auth_url()
-    logger.info(f"updating token for {auth_url}")
-    metadatas = get_all_metadatas()
-    if 'auth_url' in metadatas:
+    logger.info("updating token for %s", auth_url)
+    _metadata_cache = None
+    try:
+        with open(_metadata_path, 'rb') as f:
+            metadatas = _loads(f.read())
+        if auth_url not in metadatas:
+            return
         metadatas[auth_url]['token'] = token
-        _write_metadatas(metadatas)
+        _replace_metadatas(_dumps(metadatas))
+    except FileNotFoundError:
+        return
+    except Exception as e:
+        logger.error("Error updating token for %s: %s", auth_url, e)
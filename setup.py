@@ -29,8 +29,13 @@ gui_require = [
     'pygobject',
 ]
 
+speedups_require = [
+    'orjson',
+]
+
 extras_require = {
     'gui': gui_require,
+    'speedups': speedups_require,
     'test': tests_require,
     'mypy': mypy_require,
 }
@@ -1,7 +1,13 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import time
 from unittest import TestCase
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, call
 from argparse import Namespace
-from eduvpn.actions import fetch_token, refresh, activate, deactivate
+from eduvpn.actions import fetch_token, refresh, activate, deactivate, get_config_and_keycert, token_expires_soon
+from eduvpn import storage
 from tests.mock_config import mock_server, mock_org
 from oauthlib.oauth2.rfc6749.errors import InvalidGrantError
 
@@ -60,6 +66,42 @@ class TestCli(TestCase):
         get_info.return_value = "api_base_uri", "token_endpoint", "auth_endpoint"
         refresh()
 
+    @patch('eduvpn.storage.get_auth_url')
+    @patch('eduvpn.actions.OAuth2Session')
+    @patch('eduvpn.actions.get_storage')
+    @patch('eduvpn.actions.get_cert_key')
+    @patch('eduvpn.actions.get_info')
+    @patch('eduvpn.actions.check_certificate')
+    @patch('eduvpn.actions.create_keypair')
+    @patch('eduvpn.actions.get_config')
+    @patch('eduvpn.actions.save_connection_with_mainloop')
+    @patch('eduvpn.actions.get_client')
+    def test_refresh_stores_token(
+            self,
+            get_client: MagicMock,
+            save_connection: MagicMock,
+            get_config: MagicMock,
+            create_keypair: MagicMock,
+            check_certificate: MagicMock,
+            get_info: MagicMock,
+            get_cert_key: MagicMock,
+            get_storage: MagicMock,
+            oauth: MagicMock,
+            get_auth_url: MagicMock,
+    ):
+        oauth.return_value.refresh_token.return_value = {'access_token': 'new'}
+        check_certificate.return_value = True
+        get_cert_key.return_value = "cert", "key"
+        get_storage.return_value = "uuid", "https://test/", ({}, "", "", "", "", "", "", "", "", None, None)
+        get_info.return_value = "api_base_uri", "token_endpoint", "auth_endpoint"
+        get_auth_url.return_value = "https://test/"
+        with TemporaryDirectory() as tempdir:
+            with patch('eduvpn.storage._metadata_path', Path(tempdir) / "metadata.json"):
+                storage._write_metadatas({'https://test/': {'token': {'access_token': 'old'}}})
+                refresh()
+                metadatas = json.loads(storage._metadata_path.read_bytes())
+        self.assertEqual(metadatas['https://test/']['token'], {'access_token': 'new'})
+
     @patch('eduvpn.actions.OAuth2Session')
     @patch('eduvpn.actions.get_storage')
     @patch('eduvpn.actions.get_cert_key')
@@ -89,6 +131,48 @@ class TestCli(TestCase):
         get_info.return_value = "api_base_uri", "token_endpoint", "auth_endpoint"
         refresh()
 
+    @patch('eduvpn.actions.create_keypair')
+    @patch('eduvpn.actions.get_config')
+    def test_get_config_and_keycert(self, get_config: MagicMock, create_keypair: MagicMock):
+        get_config.return_value = "a config file"
+        create_keypair.return_value = "key", "cert"
+        oauth = MagicMock()
+        oauth.token = {'expires_at': time() + 3600}
+        with patch('eduvpn.actions.ThreadPoolExecutor', wraps=ThreadPoolExecutor) as executor:
+            result = get_config_and_keycert(oauth, "api_url", "internet")
+        executor.assert_called_once()
+        self.assertEqual(result, ("a config file", "key", "cert"))
+        get_config.assert_called_once_with(oauth, "api_url", "internet")
+        create_keypair.assert_called_once_with(oauth, "api_url")
+
+    @patch('eduvpn.actions.create_keypair')
+    @patch('eduvpn.actions.get_config')
+    def test_get_config_and_keycert_token_expires_soon(self, get_config: MagicMock, create_keypair: MagicMock):
+        requests = MagicMock()
+        requests.attach_mock(get_config, 'get_config')
+        requests.attach_mock(create_keypair, 'create_keypair')
+        get_config.return_value = "a config file"
+        create_keypair.return_value = "key", "cert"
+        oauth = MagicMock()
+        oauth.token = {'expires_at': time()}
+        with patch('eduvpn.actions.ThreadPoolExecutor') as executor:
+            result = get_config_and_keycert(oauth, "api_url", "internet")
+        executor.assert_not_called()
+        self.assertEqual(result, ("a config file", "key", "cert"))
+        self.assertEqual(requests.mock_calls, [
+            call.get_config(oauth, "api_url", "internet"),
+            call.create_keypair(oauth, "api_url"),
+        ])
+
+    def test_token_expires_soon(self):
+        oauth = MagicMock()
+        oauth.token = {'expires_at': time() + 3600}
+        self.assertFalse(token_expires_soon(oauth))
+        oauth.token = {'expires_at': time() + 10}
+        self.assertTrue(token_expires_soon(oauth))
+        oauth.token = {}
+        self.assertTrue(token_expires_soon(oauth))
+
     @patch('eduvpn.actions.refresh')
     @patch('eduvpn.actions.activate_connection_with_mainloop')
     @patch('eduvpn.actions.get_client')
@@ -0,0 +1,117 @@
+from os import replace, utime
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+from eduvpn import storage
+
+
+class TestStorage(TestCase):
+    def setUp(self):
+        self.tempdir = TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        path = Path(self.tempdir.name) / "metadata.json"
+        patcher = patch('eduvpn.storage._metadata_path', path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @patch('eduvpn.storage.get_auth_url')
+    def test_update_token(self, get_auth_url):
+        get_auth_url.return_value = 'https://test/'
+        storage._write_metadatas({
+            'https://test/': {'token': {'access_token': 'old'}, 'display_name': 'test'},
+            'https://other/': {'token': {'access_token': 'other'}},
+        })
+        storage.update_token({'access_token': 'new'})
+        metadatas = storage.get_all_metadatas()
+        self.assertEqual(metadatas['https://test/']['token'], {'access_token': 'new'})
+        self.assertEqual(metadatas['https://test/']['display_name'], 'test')
+        self.assertEqual(metadatas['https://other/']['token'], {'access_token': 'other'})
+
+    @patch('eduvpn.storage.get_auth_url')
+    def test_update_token_unknown_auth_url(self, get_auth_url):
+        get_auth_url.return_value = 'https://unknown/'
+        storage._write_metadatas({'https://test/': {'token': {'access_token': 'old'}}})
+        storage.update_token({'access_token': 'new'})
+        self.assertEqual(storage.get_all_metadatas(),
+                         {'https://test/': {'token': {'access_token': 'old'}}})
+
+    @patch('eduvpn.storage.get_auth_url')
+    def test_update_token_no_metadata(self, get_auth_url):
+        get_auth_url.return_value = 'https://test/'
+        storage.update_token({'access_token': 'new'})
+        self.assertEqual(storage.get_all_metadatas(), {})
+
+    @patch('eduvpn.storage.get_auth_url')
+    def test_update_token_failure_keeps_metadata(self, get_auth_url):
+        get_auth_url.return_value = 'https://test/'
+        metadatas = {'https://test/': {'token': {'access_token': 'old'}, 'display_name': 'test'}}
+        storage._write_metadatas(metadatas)
+        before = storage._metadata_path.read_bytes()
+        storage.update_token({'access_token': object()})
+        self.assertEqual(storage._metadata_path.read_bytes(), before)
+        self.assertEqual(storage.get_all_metadatas(), metadatas)
+        self.assertEqual(list(Path(self.tempdir.name).iterdir()), [storage._metadata_path])
+
+    @patch('eduvpn.storage.get_auth_url')
+    def test_update_token_keeps_mode(self, get_auth_url):
+        get_auth_url.return_value = 'https://test/'
+        storage._write_metadatas({'https://test/': {'token': {'access_token': 'old'}}})
+        storage._metadata_path.chmod(0o644)
+        storage.update_token({'access_token': 'new'})
+        self.assertEqual(storage._metadata_path.stat().st_mode & 0o777, 0o644)
+
+    def test_new_metadata_private(self):
+        storage._write_metadatas({})
+        self.assertEqual(storage._metadata_path.stat().st_mode & 0o777, 0o600)
+
+    def test_get_all_metadatas_cached(self):
+        storage._write_metadatas({'https://test/': {'display_name': 'test'}})
+        storage.get_all_metadatas()
+        with patch('eduvpn.storage._loads') as loads:
+            self.assertEqual(storage.get_all_metadatas(), {'https://test/': {'display_name': 'test'}})
+            loads.assert_not_called()
+
+    def test_get_all_metadatas_returns_copy(self):
+        storage._write_metadatas({'https://test/': {'display_name': 'test'}})
+        storage.get_all_metadatas().pop('https://test/')
+        storage.get_all_metadatas()['https://other/'] = {}
+        self.assertEqual(storage.get_all_metadatas(), {'https://test/': {'display_name': 'test'}})
+
+    def test_get_all_metadatas_after_write(self):
+        storage._write_metadatas({'https://test/': {'display_name': 'test'}})
+        storage.get_all_metadatas()
+        storage._write_metadatas({'https://test/': {'display_name': 'changed'}})
+        self.assertEqual(storage.get_all_metadatas()['https://test/']['display_name'], 'changed')
+
+    def test_get_all_metadatas_after_same_size_replace(self):
+        storage._write_metadatas({'https://test/': {'display_name': 'aaaa'}})
+        stat = storage._metadata_path.stat()
+        storage.get_all_metadatas()
+        # Another process replaces the file with one of the same size and mtime.
+        other = Path(self.tempdir.name) / "other.json"
+        other.write_bytes(storage._dumps({'https://test/': {'display_name': 'bbbb'}}))
+        utime(other, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        replace(other, storage._metadata_path)
+        self.assertEqual(storage.get_all_metadatas()['https://test/']['display_name'], 'bbbb')
+
+    @patch('eduvpn.storage.orjson', None)
+    def test_metadatas_without_orjson(self):
+        storage._write_metadatas({'https://test/': {'display_name': 'test'}})
+        self.assertEqual(storage.get_all_metadatas(), {'https://test/': {'display_name': 'test'}})
+
+    def test_write_config(self):
+        target = Path(self.tempdir.name) / "test.ovpn"
+        storage.write_config("config", "private key", "certificate", target)
+        self.assertEqual(target.read_text(),
+                         "config\n<key>\nprivate key\n</key>\n\n<cert>\ncertificate\n</cert>\n")
+
+    def test_get_all_metadatas_missing(self):
+        self.assertEqual(storage.get_all_metadatas(), {})
+
+    def test_get_all_metadatas_stat_error(self):
+        parent = Path(self.tempdir.name) / "file"
+        parent.write_text("")
+        with patch('eduvpn.storage._metadata_path', parent / "metadata.json"):
+            self.assertEqual(storage.get_all_metadatas(), {})